@@ -6,6 +6,7 @@ import pandas as pd
 
 # from src.common import enums
 from src.data import import_data, schema
+from src.models import statements
 
 
 @dataclass
@@ -74,6 +75,8 @@ class Site:
         Adds the current months readings to the historical readings file
     split_dataframe_by_commercial:
         Splits the dataframe into two based on whether the tenant is residencial or commercial
+    tenant_statements:
+        Creates one statement per tenant from the calculated charges
     recharging_tenants:
         Recharges the tenants. Main function to be called.
   """
@@ -424,6 +427,27 @@ class Site:
     non_commercial_df.to_csv(self.save_folder / 'resident_charges.csv',
                              encoding='utf-8-sig')
 
+  def tenant_statements(self,
+                        statement_format: str = 'html',
+                        max_workers: int | None = None) -> list[Path]:
+    """
+    Creates one statement per tenant from the calculated charges
+
+    Arguments:
+        statement_format (Optional[str]): Either 'html' or 'txt', by default 'html'.
+        max_workers (Optional[int]): The number of worker processes, see `statements.generate_statements`.
+
+    Returns:
+        list[Path]: The paths of the saved statements.
+    """
+    dataf = self.calculate_charges()
+    return statements.generate_statements(dataf,
+                                          site_name=self.name,
+                                          save_folder=self.save_folder /
+                                          'statements',
+                                          statement_format=statement_format,
+                                          max_workers=max_workers)
+
   def recharging_tenants(self):
     """
     Recharges the tenants. Main function to be called.
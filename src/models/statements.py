@@ -0,0 +1,296 @@
+import csv
+import html
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from string import Template
+
+import pandas as pd
+
+from src.data import schema
+
+UTILITY_NAMES = {'E': 'Electric', 'G': 'Gas', 'W': 'Water'}
+UTILITY_UNITS = {'E': 'kWh', 'G': 'kWh', 'W': 'm3'}
+
+STATEMENT_COLUMNS = [
+    schema.MeterSchema.UTILITY, schema.MeterSchema.CONSUMPTION,
+    schema.GeneralValsSchema.RECHARGE, schema.GeneralValsSchema.FIXED,
+    schema.MeterSchema.N_CHARGE, schema.MeterSchema.G_CHARGE
+]
+
+HEADER = [
+    'Utility', 'Consumption', 'Unit', 'Rate (GBP/unit)', 'Fixed charge (GBP)',
+    'Net charge (GBP)', 'Gross charge (GBP)'
+]
+
+STATEMENT_FORMATS = ['html', 'txt']
+
+UNSAFE_FILE_CHARACTERS = re.compile(r'[^\w .-]')
+DIGITS = re.compile(r'(\d+)')
+
+# An untuned estimate of where the process pool starts to pay for its start up
+# and pickling costs. Measure on the target machine before relying on it.
+POOL_THRESHOLD = 2000
+
+# The HTML templates are compiled once at import so each worker only substitutes values.
+HTML_ROW = Template('<tr><td>$utility</td><td>$consumption</td>'
+                    '<td>$unit</td><td>$rate</td><td>$fixed</td><td>$net</td>'
+                    '<td>$gross</td></tr>')
+HTML_STATEMENT = Template("""<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>$site_name - $tenant</title></head>
+<body>
+<h1>$site_name</h1>
+<h2>Statement for tenant $tenant</h2>
+<p>Period from: $period</p>
+<table>
+<tr>$header</tr>
+$rows
+<tr><th>Total</th><td></td><td></td><td></td><td>$total_fixed</td><td>$total_net</td><td>$total_gross</td></tr>
+</table>
+</body>
+</html>
+""")
+HTML_HEADER = ''.join(f'<th>{html.escape(column)}</th>' for column in HEADER)
+
+
+def natural_key(tenant: str) -> list[str | int]:
+  """
+  Creates a sort key that orders numbered tenants as 1, 2, 10 rather than 1, 10, 2.
+
+  Arguments:
+      tenant (str): The tenant identifier.
+
+  Returns:
+      list[str | int]: The sort key.
+  """
+  return [
+      int(part) if index % 2 else part.lower()
+      for index, part in enumerate(DIGITS.split(tenant))
+  ]
+
+
+def check_statement_format(statement_format: str) -> None:
+  """
+  Checks that the statement format is supported.
+
+  Arguments:
+      statement_format (str): The statement format to check.
+  """
+  if statement_format not in STATEMENT_FORMATS:
+    raise ValueError(f'Unknown statement format: {statement_format}. '
+                     f'Expected one of {STATEMENT_FORMATS}.')
+
+
+def group_tenant_charges(
+    charges: pd.DataFrame
+) -> list[tuple[str, str, list[tuple[str, float, float, float, float,
+                                     float]]]]:
+  """
+  Groups the charges by tenant and period in a single pass.
+
+  Arguments:
+      charges (pd.DataFrame): The output of `Site.calculate_charges`.
+
+  Returns:
+      list[tuple[str, str, list[tuple]]]: One entry per tenant and period containing the tenant, the period and the charge rows in `STATEMENT_COLUMNS` order.
+  """
+  dataf = charges[[schema.MeterSchema.SITE, schema.MeterSchema.DATE] +
+                  STATEMENT_COLUMNS].copy()
+  dataf[schema.MeterSchema.SITE] = dataf[schema.MeterSchema.SITE].astype(str)
+  dataf[schema.MeterSchema.DATE] = pd.to_datetime(
+      dataf[schema.MeterSchema.DATE]).dt.strftime('%Y-%m-%d')
+  dataf = dataf.sort_values(
+      [schema.MeterSchema.DATE, schema.MeterSchema.UTILITY])
+  # A single pass over the sorted rows is far cheaper than slicing the
+  # dataframe once per tenant.
+  grouped = {}
+  for tenant, period, *row in dataf.itertuples(index=False, name=None):
+    grouped.setdefault((tenant, period), []).append(tuple(row))
+  return [(tenant, period, grouped[(tenant, period)])
+          for tenant, period in sorted(
+              grouped, key=lambda key: (natural_key(key[0]), key[1]))]
+
+
+def statement_lines(
+    rows: list[tuple]) -> tuple[list[list[str]], tuple[str, str, str]]:
+  """
+  Formats the charge rows of a statement and totals them.
+
+  The fixed and net charges are rounded to pence and the gross charge is their
+  sum, so each line and the totals add up exactly as printed.
+
+  Arguments:
+      rows (list[tuple]): The charge rows of the tenant in `STATEMENT_COLUMNS` order.
+
+  Returns:
+      tuple[list[list[str]], tuple[str, str, str]]: The formatted lines and the fixed, net and gross totals.
+  """
+  lines = []
+  total_fixed = total_net = total_gross = 0.0
+  for utility, consumption, rate, fixed, net, _ in rows:
+    fixed, net = round(fixed, 2), round(net, 2)
+    gross = round(fixed + net, 2)
+    lines.append([
+        UTILITY_NAMES.get(utility, str(utility)), f'{consumption:.2f}',
+        UTILITY_UNITS.get(utility, ''), f'{rate:.6f}', f'{fixed:.2f}',
+        f'{net:.2f}', f'{gross:.2f}'
+    ])
+    total_fixed += fixed
+    total_net += net
+    total_gross += gross
+  return lines, (f'{total_fixed:.2f}', f'{total_net:.2f}',
+                 f'{total_gross:.2f}')
+
+
+def render_statement(site_name: str, tenant: str, period: str,
+                     rows: list[tuple], statement_format: str = 'html') -> str:
+  """
+  Renders the statement of a single tenant.
+
+  Arguments:
+      site_name (str): The name of the site.
+      tenant (str): The tenant the statement is for.
+      period (str): The start of the billing period.
+      rows (list[tuple]): The charge rows of the tenant in `STATEMENT_COLUMNS` order.
+      statement_format (Optional[str]): Either 'html' or 'txt', by default 'html'.
+
+  Returns:
+      str: The rendered statement.
+  """
+  check_statement_format(statement_format)
+  lines, (total_fixed, total_net, total_gross) = statement_lines(rows)
+  if statement_format == 'html':
+    rendered_rows = '\n'.join(
+        HTML_ROW.substitute(utility=html.escape(utility),
+                            consumption=consumption,
+                            unit=unit,
+                            rate=rate,
+                            fixed=fixed,
+                            net=net,
+                            gross=gross)
+        for utility, consumption, unit, rate, fixed, net, gross in lines)
+    return HTML_STATEMENT.substitute(site_name=html.escape(site_name),
+                                     tenant=html.escape(tenant),
+                                     period=period,
+                                     header=HTML_HEADER,
+                                     rows=rendered_rows,
+                                     total_fixed=total_fixed,
+                                     total_net=total_net,
+                                     total_gross=total_gross)
+  buffer = io.StringIO()
+  writer = csv.writer(buffer, lineterminator='\n')
+  writer.writerows([['Site', site_name], ['Tenant', tenant],
+                    ['Period from', period], [], HEADER])
+  writer.writerows(lines)
+  writer.writerow(['Total', '', '', '', total_fixed, total_net, total_gross])
+  return buffer.getvalue()
+
+
+def statement_file_names(grouped: list[tuple],
+                         statement_format: str) -> list[str]:
+  """
+  Creates a unique, file system safe file name for each statement.
+
+  Arguments:
+      grouped (list[tuple]): Entries produced by `group_tenant_charges`.
+      statement_format (str): Either 'html' or 'txt'.
+
+  Returns:
+      list[str]: The file names in the same order as `grouped`.
+  """
+  file_names = []
+  used = set()
+  for tenant, period, _ in grouped:
+    stem = f"{UNSAFE_FILE_CHARACTERS.sub('_', tenant)}_{period}"
+    file_name = f'{stem}.{statement_format}'
+    suffix = 1
+    while file_name.lower() in used:
+      suffix += 1
+      file_name = f'{stem}_{suffix}.{statement_format}'
+    used.add(file_name.lower())
+    file_names.append(file_name)
+  return file_names
+
+
+def _write_statements(site_name: str, save_folder: Path, statement_format: str,
+                      batch: list[tuple]) -> list[Path]:
+  """
+  Renders and saves a batch of statements. Runs inside a worker process when the pool is used.
+
+  Arguments:
+      site_name (str): The name of the site.
+      save_folder (Path): The folder the statements are saved in.
+      statement_format (str): Either 'html' or 'txt'.
+      batch (list[tuple]): Entries produced by `group_tenant_charges` with the file name appended.
+
+  Returns:
+      list[Path]: The paths of the saved statements.
+  """
+  paths = []
+  for tenant, period, rows, file_name in batch:
+    path = save_folder / file_name
+    path.write_text(render_statement(site_name, tenant, period, rows,
+                                     statement_format),
+                    encoding='utf-8',
+                    newline='')
+    paths.append(path)
+  return paths
+
+
+def generate_statements(charges: pd.DataFrame,
+                        site_name: str,
+                        save_folder: Path,
+                        statement_format: str = 'html',
+                        max_workers: int | None = None) -> list[Path]:
+  """
+  Generates one statement per tenant from the output of `Site.calculate_charges`.
+
+  Statements are rendered in the current process unless there are at least
+  `POOL_THRESHOLD` of them or `max_workers` is above 1, in which case a process
+  pool is used. On Windows and macOS worker processes are spawned, so a plain
+  script using the pool must call this under an `if __name__ == '__main__':` guard.
+
+  Arguments:
+      charges (pd.DataFrame): The output of `Site.calculate_charges`.
+      site_name (str): The name of the site.
+      save_folder (Path): The folder the statements are saved in.
+      statement_format (Optional[str]): Either 'html' or 'txt' (comma separated values), by default 'html'.
+      max_workers (Optional[int]): The number of worker processes, by default the number of CPUs once `POOL_THRESHOLD` is reached. Use 1 to render in the current process.
+
+  Returns:
+      list[Path]: The paths of the saved statements.
+  """
+  check_statement_format(statement_format)
+  if max_workers is not None and max_workers < 1:
+    raise ValueError(f'max_workers must be at least 1, got {max_workers}.')
+  save_folder.mkdir(parents=True, exist_ok=True)
+  grouped = group_tenant_charges(charges)
+  if not grouped:
+    return []
+  file_names = statement_file_names(grouped, statement_format)
+  entries = [(*entry, file_name)
+             for entry, file_name in zip(grouped, file_names)]
+  if max_workers is None:
+    workers = (os.cpu_count() or 1) if len(entries) >= POOL_THRESHOLD else 1
+  else:
+    workers = max_workers
+  if workers == 1:
+    return _write_statements(site_name, save_folder, statement_format,
+                             entries)
+  # Send a few large batches per worker rather than one task per tenant.
+  batch_size = -(-len(entries) // (workers * 4))
+  batches = [
+      entries[i:i + batch_size] for i in range(0, len(entries), batch_size)
+  ]
+  paths = []
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    for batch_paths in executor.map(_write_statements,
+                                    [site_name] * len(batches),
+                                    [save_folder] * len(batches),
+                                    [statement_format] * len(batches),
+                                    batches):
+      paths.extend(batch_paths)
+  return paths
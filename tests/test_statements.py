@@ -0,0 +1,138 @@
+import csv
+import io
+
+import pandas as pd
+import pytest
+
+from src.data import schema
+from src.models import statements
+
+
+@pytest.fixture
+def charges() -> pd.DataFrame:
+  return pd.DataFrame({
+      schema.MeterSchema.DATE: ['2023-03-01'] * 5 + ['2023-04-01'],
+      schema.MeterSchema.SITE: ['1', '1', '1', 'Smith, Jones', 'Flat 1/2', '1'],
+      schema.MeterSchema.UTILITY: ['W', 'E', 'G', 'E', 'E', 'E'],
+      schema.MeterSchema.CONSUMPTION: [10.0, 100.0, 5.0, 20.0, 1.0, 50.0],
+      schema.GeneralValsSchema.RECHARGE: [0.5, 0.3, 0.4, 0.2, 0.1, 0.3],
+      schema.GeneralValsSchema.FIXED: [0.0, 0.0, 0.0, 1.0, 0.0, 0.0],
+      schema.MeterSchema.N_CHARGE: [1.005, 1.005, 1.005, 4.0, 0.1, 15.0],
+      schema.MeterSchema.G_CHARGE: [1.005, 1.005, 1.005, 5.0, 0.1, 15.0],
+  })
+
+
+def test_group_tenant_charges(charges):
+  grouped = statements.group_tenant_charges(charges)
+  assert [(tenant, period) for tenant, period, _ in grouped] == [
+      ('1', '2023-03-01'), ('1', '2023-04-01'), ('Flat 1/2', '2023-03-01'),
+      ('Smith, Jones', '2023-03-01')
+  ]
+  assert [row[0] for row in grouped[0][2]] == ['E', 'G', 'W']
+
+
+def test_group_tenant_charges_orders_numeric_tenants():
+  charges = pd.DataFrame({
+      schema.MeterSchema.DATE: ['2023-03-01'] * 4,
+      schema.MeterSchema.SITE: [10, 2, 1, 11],
+      schema.MeterSchema.UTILITY: ['E'] * 4,
+      schema.MeterSchema.CONSUMPTION: [1.0] * 4,
+      schema.GeneralValsSchema.RECHARGE: [1.0] * 4,
+      schema.GeneralValsSchema.FIXED: [0.0] * 4,
+      schema.MeterSchema.N_CHARGE: [1.0] * 4,
+      schema.MeterSchema.G_CHARGE: [1.0] * 4,
+  })
+  grouped = statements.group_tenant_charges(charges)
+  assert [tenant for tenant, _, _ in grouped] == ['1', '2', '10', '11']
+
+
+def test_render_statement_html_escapes_names(charges):
+  _, period, rows = statements.group_tenant_charges(charges)[0]
+  rendered = statements.render_statement('Test <Site>', 'A & B', period, rows)
+  assert 'Test &lt;Site&gt;' in rendered
+  assert 'A &amp; B' in rendered
+  assert '<Site>' not in rendered
+
+
+def test_totals_equal_sum_of_lines(charges):
+  _, period, rows = statements.group_tenant_charges(charges)[0]
+  rendered = statements.render_statement('Test Site', '1', period, rows, 'txt')
+  lines = list(csv.reader(io.StringIO(rendered)))
+  gross = [float(line[6]) for line in lines[5:-1]]
+  assert gross == [1.0, 1.0, 1.0]
+  assert lines[-1] == ['Total', '', '', '', '0.00', '3.00', '3.00']
+
+
+def test_lines_add_up_with_half_penny_net():
+  rows = [('W', 10.0, 2.75, 72.78, 1.125, 73.905),
+          ('E', 10.0, 0.25, 10.01, 2.125, 12.135)]
+  lines, totals = statements.statement_lines(rows)
+  assert lines[0][4:] == ['72.78', '1.12', '73.90']
+  for line in lines:
+    assert round(float(line[4]) + float(line[5]), 2) == float(line[6])
+  assert totals == (
+      f'{sum(float(line[4]) for line in lines):.2f}',
+      f'{sum(float(line[5]) for line in lines):.2f}',
+      f'{sum(float(line[6]) for line in lines):.2f}',
+  )
+  assert float(totals[0]) + float(totals[1]) == pytest.approx(
+      float(totals[2]))
+
+
+def test_water_is_shown_in_cubic_metres(charges):
+  _, _, rows = statements.group_tenant_charges(charges)[0]
+  lines, _ = statements.statement_lines(rows)
+  assert [(line[0], line[2]) for line in lines] == [('Electric', 'kWh'),
+                                                    ('Gas', 'kWh'),
+                                                    ('Water', 'm3')]
+
+
+def test_render_statement_rejects_unknown_format(charges):
+  _, period, rows = statements.group_tenant_charges(charges)[0]
+  with pytest.raises(ValueError):
+    statements.render_statement('Test Site', '1', period, rows, 'pdf')
+
+
+@pytest.mark.parametrize('max_workers', [0, -1])
+def test_generate_statements_rejects_invalid_max_workers(
+    charges, tmp_path, max_workers):
+  with pytest.raises(ValueError):
+    statements.generate_statements(charges, 'Test Site', tmp_path,
+                                   max_workers=max_workers)
+
+
+def test_txt_round_trips_through_csv(charges):
+  tenant, period, rows = statements.group_tenant_charges(charges)[-1]
+  rendered = statements.render_statement('Smith, Jones Estate', tenant,
+                                         period, rows, 'txt')
+  lines = list(csv.reader(io.StringIO(rendered)))
+  assert lines[0] == ['Site', 'Smith, Jones Estate']
+  assert lines[1] == ['Tenant', 'Smith, Jones']
+  assert lines[4] == statements.HEADER
+  assert lines[5] == [
+      'Electric', '20.00', 'kWh', '0.200000', '1.00', '4.00', '5.00'
+  ]
+
+
+def test_file_names_are_safe_and_unique():
+  grouped = [('Flat 1/2', '2023-03-01', []), ('Flat 1_2', '2023-03-01', []),
+             ('Flat 1:2', '2023-03-01', [])]
+  assert statements.statement_file_names(grouped, 'html') == [
+      'Flat 1_2_2023-03-01.html', 'Flat 1_2_2023-03-01_2.html',
+      'Flat 1_2_2023-03-01_3.html'
+  ]
+
+
+@pytest.mark.parametrize('statement_format', statements.STATEMENT_FORMATS)
+def test_pool_matches_in_process(charges, tmp_path, statement_format):
+  serial = statements.generate_statements(charges, 'Test Site',
+                                          tmp_path / 'serial',
+                                          statement_format, max_workers=1)
+  pooled = statements.generate_statements(charges, 'Test Site',
+                                          tmp_path / 'pooled',
+                                          statement_format, max_workers=2)
+  assert len(serial) == 4
+  assert [path.name for path in serial] == [path.name for path in pooled]
+  for serial_path, pooled_path in zip(serial, pooled):
+    assert serial_path.read_text(encoding='utf-8') == pooled_path.read_text(
+        encoding='utf-8')